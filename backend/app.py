@@ -1,102 +1,262 @@
-print("Starting imports...") 
-
-from flask import Flask, jsonify, request
+from flask import Flask, request
 from flask_cors import CORS
-print("Flask imported...")
+from collections import Counter
+import numpy as np
+import orjson
 
 from data_fetcher import fetch_calgary_buildings
-print("data_fetcher imported...")
-
 from llm_handler import process_query
-print("llm_handler imported...")
 
+import base64
+import hashlib
+import logging
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
-print("Environment loaded...")
+
+# Quiet by default; set LOG_LEVEL=DEBUG to trace each query
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'WARNING').upper())
+log = logging.getLogger(__name__)
 
 app = Flask(__name__)
-CORS(app)
-print("Flask app created...")
+# The dashboard reads the ETag to check that query rows index its copy of the buildings
+CORS(app, expose_headers=['ETag'])
 
 building_cache = None
+building_cache_bytes = None
+building_cache_etag = None
+building_columns = None
+building_cache_lock = threading.Lock()
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def orjson_response(payload, status=200):
+    """Serialize payload with orjson instead of Flask's stdlib json encoder."""
+    return app.response_class(
+        orjson.dumps(payload, option=ORJSON_OPTIONS),
+        status=status,
+        mimetype='application/json'
+    )
+
+
+def load_building_cache():
+    """Fetch buildings and pre-serialize the /api/buildings payload once."""
+    global building_cache, building_cache_bytes, building_cache_etag, building_columns
+    
+    # Double-checked so concurrent first requests trigger a single fetch
+    if building_cache is not None:
+        return building_cache
+    
+    with building_cache_lock:
+        if building_cache is not None:
+            return building_cache
+        
+        buildings = fetch_calgary_buildings()
+        building_cache_bytes = orjson.dumps({
+            'success': True,
+            'data': buildings,
+            'count': len(buildings)
+        }, option=ORJSON_OPTIONS)
+        building_cache_etag = hashlib.blake2b(building_cache_bytes, digest_size=16).hexdigest()
+        building_columns = build_columns(buildings)
+        # Assigned last: a non-None building_cache means everything above is ready
+        building_cache = buildings
+    
+    return building_cache
 
 @app.route('/api/buildings', methods=['GET'])
 def get_buildings():
     """Fetch and return building data for Calgary."""
-    global building_cache
-    
     try:
-        if building_cache is None:
-            building_cache = fetch_calgary_buildings()
+        load_building_cache()
         
-        return jsonify({
-            'success': True,
-            'data': building_cache,
-            'count': len(building_cache)
-        })
+        # Clients that already hold this exact payload get a bodyless 304
+        if request.if_none_match.contains_weak(building_cache_etag):
+            response = app.response_class(status=304)
+        else:
+            response = app.response_class(building_cache_bytes, mimetype='application/json')
+        
+        response.set_etag(building_cache_etag)
+        response.cache_control.max_age = 3600
+        return response
     except Exception as e:
-        return jsonify({
+        return orjson_response({
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500)
 
 @app.route('/api/query', methods=['POST'])
 def query_buildings():
     """Process natural language query and filter buildings."""
-    global building_cache
-    
-    print("="*60)
-    print("ROUTE /api/query HIT")
-    print("="*60)
-    
     try:
         data = request.get_json()
         user_query = data.get('query', '')
         
-        print(f"User query: '{user_query}'")
+        log.debug("User query: '%s'", user_query)
         
         if not user_query:
-            return jsonify({'success': False, 'error': 'No query provided'}), 400
+            return orjson_response({'success': False, 'error': 'No query provided'}, 400)
         
         if building_cache is None:
-            print("Loading building cache...")
-            building_cache = fetch_calgary_buildings()
-            print(f"Loaded {len(building_cache)} buildings")
+            log.debug("Loading building cache...")
+            load_building_cache()
+            log.debug("Loaded %d buildings", len(building_cache))
         
-        print("Calling process_query...")
         filter_result = process_query(user_query)
-        print(f"Filter result: {filter_result}")
+        log.debug("Filter result: %s", filter_result)
         
         if not filter_result.get('success'):
-            return jsonify(filter_result), 400
+            return orjson_response(filter_result, 400)
         
         filter_data = filter_result.get('filter', {})
         
-        print("Applying filter...")
-        filtered_ids = apply_filter(building_cache, filter_data)
-        print(f"Found {len(filtered_ids)} matching buildings")
+        matching_rows = apply_filter(building_columns, filter_data)
+        log.debug("Found %d matching buildings", len(matching_rows))
         
-        return jsonify({
+        # Rows index into the /api/buildings 'data' whose ETag is 'etag', packed as little-endian uint32
+        return orjson_response({
             'success': True,
             'filter': filter_data,
-            'matching_ids': filtered_ids,
-            'count': len(filtered_ids),
+            'matching_rows': base64.b64encode(matching_rows.astype('<u4').tobytes()).decode('ascii'),
+            'count': len(matching_rows),
+            'etag': building_cache_etag,
             'source': filter_result.get('source', 'UNKNOWN')
         })
     except Exception as e:
-        print(f"EXCEPTION: {e}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({
+        log.exception("Query failed: %s", e)
+        return orjson_response({
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500)
+
+
+# Map attribute names to actual data fields
+ATTRIBUTE_MAP = {
+    'height': 'height',
+    'value': 'assessed_value',
+    'assessed_value': 'assessed_value',
+    'zoning': 'zoning',
+    'zone': 'zoning',
+    'type': 'building_type',
+    'building_type': 'building_type',
+    'address': 'address',
+    'street': 'address',
+    'land_size': 'land_size_sf',
+    'land_size_sf': 'land_size_sf',
+    'lot_size': 'land_size_sf'
+}
+
+NUMERIC_COLUMNS = ('height', 'assessed_value', 'land_size_sf', 'latitude', 'longitude')
+STRING_COLUMNS = ('id', 'address', 'zoning', 'building_type')
+FILTER_COLUMNS = NUMERIC_COLUMNS + STRING_COLUMNS
+QUADRANTS = ('NW', 'NE', 'SW', 'SE')
 
+NUMERIC_OPERATORS = {
+    '>': np.greater,
+    '<': np.less,
+    '>=': np.greater_equal,
+    '<=': np.less_equal,
+    '==': np.equal,
+    '!=': np.not_equal
+}
 
-def apply_filter(buildings, filter_obj):
-    """Apply the parsed filter(s) to building data."""
+STRING_OPERATORS = {
+    'contains': lambda strings, v: np.char.find(strings, v) >= 0,
+    'equals': lambda strings, v: strings == v,
+    '=': lambda strings, v: strings == v,
+    'endswith': np.char.endswith,
+    'startswith': np.char.startswith
+}
+
+
+def to_float(value):
+    """Convert a value to float, returning NaN when it is missing or non-numeric."""
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return np.nan
+
+
+def build_columns(buildings):
+    """Convert the building list into parallel column arrays for vectorized filtering."""
+    columns = {'present': {}, 'order': {}, 'sorted': {}, 'counts': {}}
+    
+    for name in NUMERIC_COLUMNS:
+        columns[name] = np.array([to_float(b.get(name)) for b in buildings], dtype=np.float64)
+        columns['present'][name] = ~np.isnan(columns[name])
+        # Row indices ordered by value, so numeric range filters become a binary search
+        present_rows = np.flatnonzero(columns['present'][name])
+        order = present_rows[np.argsort(columns[name][present_rows], kind='stable')]
+        columns['order'][name] = order
+        columns['sorted'][name] = columns[name][order]
+    
+    # String columns are upper-cased once here so queries skip the case fold
+    for name in STRING_COLUMNS:
+        values = [b.get(name) for b in buildings]
+        columns[name] = np.array(['' if v is None else str(v).upper() for v in values], dtype=str)
+        columns['present'][name] = np.array([v is not None for v in values], dtype=bool)
+        columns['counts'][name] = Counter(columns[name][columns['present'][name]].tolist())
+    
+    # Calgary addresses end in a quadrant, so "endswith NW" style filters become a bucket lookup
+    suffixes = [address[-2:] for address in columns['address'].tolist()]
+    columns['quadrants'] = {
+        quadrant: np.array([i for i, suffix in enumerate(suffixes) if suffix == quadrant], dtype=np.intp)
+        for quadrant in QUADRANTS
+    }
+    
+    columns['size'] = len(buildings)
+    return columns
+
+
+def sorted_ranges(sorted_values, operator, value_num):
+    """Return the (start, stop) slices of a sorted column that satisfy a numeric operator."""
+    n = len(sorted_values)
+    
+    # NaN compares unequal to everything, which searchsorted would not honor
+    if np.isnan(value_num):
+        return [(0, n)] if operator == '!=' else []
+    
+    left = int(np.searchsorted(sorted_values, value_num, side='left'))
+    right = int(np.searchsorted(sorted_values, value_num, side='right'))
+    
+    return {
+        '>': [(right, n)],
+        '>=': [(left, n)],
+        '<': [(0, left)],
+        '<=': [(0, right)],
+        '==': [(left, right)],
+        '!=': [(0, left), (right, n)]
+    }[operator]
+
+
+def estimate_matches(columns, attribute, operator, value):
+    """Cheaply estimate how many rows a single filter keeps, used to order filters."""
+    n = columns['size']
+    
+    if attribute not in FILTER_COLUMNS:
+        return 0
+    
+    try:
+        if operator in NUMERIC_OPERATORS and attribute in columns['sorted']:
+            ranges = sorted_ranges(columns['sorted'][attribute], operator, float(value))
+            return sum(stop - start for start, stop in ranges)
+        
+        if attribute == 'address' and operator == 'endswith' and str(value).upper() in QUADRANTS:
+            return len(columns['quadrants'][str(value).upper()])
+        
+        if operator in ('equals', '=') and attribute in columns['counts']:
+            return columns['counts'][attribute][str(value).upper()]
+    except (ValueError, TypeError):
+        return 0
+    
+    return n
+
+
+def apply_filter(columns, filter_obj):
+    """Apply the parsed filter(s) to the columnar building data, returning matching row indices."""
     
     # Handle both single filter and multiple filters
     if 'filters' in filter_obj:
@@ -104,82 +264,68 @@ def apply_filter(buildings, filter_obj):
     else:
         filters = [filter_obj]
     
-    print(f"Applying {len(filters)} filter(s): {filters}")
-    
-    # Map attribute names to actual data fields
-    attribute_map = {
-        'height': 'height',
-        'value': 'assessed_value',
-        'assessed_value': 'assessed_value',
-        'zoning': 'zoning',
-        'zone': 'zoning',
-        'type': 'building_type',
-        'building_type': 'building_type',
-        'address': 'address',
-        'street': 'address',
-        'land_size': 'land_size_sf',
-        'land_size_sf': 'land_size_sf',
-        'lot_size': 'land_size_sf'
-    }
+    log.debug("Applying %d filter(s): %s", len(filters), filters)
     
-    matching_ids = []
+    parsed = []
+    for f in filters:
+        attribute = f.get('attribute', '').lower()
+        parsed.append((ATTRIBUTE_MAP.get(attribute, attribute), f.get('operator', ''), f.get('value')))
     
-    for building in buildings:
-        matches_all = True
+    # Most selective filters first, so the mask empties (and we stop) as early as possible
+    parsed.sort(key=lambda f: estimate_matches(columns, *f))
+    
+    n = columns['size']
+    mask = np.ones(n, dtype=bool)
+    # Comparisons write into one reused buffer and are ANDed into mask in place
+    scratch = np.empty(n, dtype=bool)
+    
+    for attribute, operator, value in parsed:
+        if not mask.any():
+            break
         
-        for f in filters:
-            attribute = f.get('attribute', '').lower()
-            operator = f.get('operator', '')
-            value = f.get('value')
-            
-            actual_attribute = attribute_map.get(attribute, attribute)
-            building_value = building.get(actual_attribute)
-            
-            if building_value is None:
-                matches_all = False
-                break
-            
-            try:
-                # Numeric comparisons
-                if operator in ['>', '<', '>=', '<=', '==', '!=']:
-                    building_num = float(building_value) if not isinstance(building_value, (int, float)) else building_value
-                    value_num = float(value)
-                    
-                    if operator == '>' and not (building_num > value_num):
-                        matches_all = False
-                    elif operator == '<' and not (building_num < value_num):
-                        matches_all = False
-                    elif operator == '>=' and not (building_num >= value_num):
-                        matches_all = False
-                    elif operator == '<=' and not (building_num <= value_num):
-                        matches_all = False
-                    elif operator == '==' and not (building_num == value_num):
-                        matches_all = False
-                    elif operator == '!=' and not (building_num != value_num):
-                        matches_all = False
+        if attribute not in FILTER_COLUMNS:
+            mask[:] = False
+            break
+        
+        column = columns[attribute]
+        
+        mask &= columns['present'][attribute]
+        
+        try:
+            # Numeric comparisons
+            if operator in NUMERIC_OPERATORS:
+                value_num = float(value)
+                
+                if column.dtype.kind == 'f':
+                    # Binary search the pre-sorted column and mark only the matching rows
+                    order = columns['order'][attribute]
+                    scratch[:] = False
+                    for start, stop in sorted_ranges(columns['sorted'][attribute], operator, value_num):
+                        scratch[order[start:stop]] = True
+                else:
+                    numbers = np.array([to_float(v) for v in column])
+                    mask &= ~np.isnan(numbers)
+                    NUMERIC_OPERATORS[operator](numbers, value_num, out=scratch)
                 
-                # String matching
-                elif operator in ['contains', 'equals', '=', 'endswith', 'startswith']:
-                    building_str = str(building_value).upper()
-                    value_str = str(value).upper()
-                    
-                    if operator == 'contains' and value_str not in building_str:
-                        matches_all = False
-                    elif operator in ['equals', '='] and building_str != value_str:
-                        matches_all = False
-                    elif operator == 'endswith' and not building_str.endswith(value_str):
-                        matches_all = False
-                    elif operator == 'startswith' and not building_str.startswith(value_str):
-                        matches_all = False
+                mask &= scratch
+            
+            # Quadrant lookup
+            elif attribute == 'address' and operator == 'endswith' and str(value).upper() in QUADRANTS:
+                in_quadrant = np.zeros(n, dtype=bool)
+                in_quadrant[columns['quadrants'][str(value).upper()]] = True
+                mask &= in_quadrant
             
-            except (ValueError, TypeError):
-                matches_all = False
-                break
+            # String matching
+            elif operator in STRING_OPERATORS:
+                value_str = str(value).upper()
+                strings = column if column.dtype.kind == 'U' else column.astype(str)
+                mask &= STRING_OPERATORS[operator](strings, value_str)
         
-        if matches_all:
-            matching_ids.append(building['id'])
+        except (ValueError, TypeError):
+            mask[:] = False
+            break
     
-    return matching_ids
+    return np.flatnonzero(mask)
 
 
 if __name__ == '__main__':
@@ -1,13 +1,28 @@
 import requests
-import json
+import logging
 import os
+import orjson
+import tempfile
+import zstandard as zstd
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-CACHE_FILE = "cached_buildings.json"
+CACHE_FILE = "cached_buildings.json.zst"
 BASE_URL = "https://data.calgary.ca/resource/4bsw-nn7w.json"
 
+log = logging.getLogger(__name__)
+
+# Shared session so the category fetches reuse pooled HTTPS connections
+SESSION = requests.Session()
+
+# Deletion table for currency formatting, applied in a single pass
+NUMBER_FORMATTING = str.maketrans("", "", ",$ \t\n")
+
 def safe_float(v):
+    if isinstance(v, (int, float)):
+        return float(v)
     try:
-        return float(str(v).replace(",", "").replace("$", "").strip())
+        return float(str(v).translate(NUMBER_FORMATTING))
     except:
         return 0.0
 
@@ -16,7 +31,7 @@ def extract_coordinates(mp):
     if not mp:
         return None
     if isinstance(mp, str):
-        mp = json.loads(mp)
+        mp = orjson.loads(mp)
 
     coords = mp.get("coordinates")
     if not coords:
@@ -70,32 +85,107 @@ def assign_ranked_heights(buildings):
 
     return buildings_sorted
 
+def load_cache_file():
+    with open(CACHE_FILE, "rb") as f:
+        return orjson.loads(zstd.ZstdDecompressor().decompress(f.read()))
+
 def fetch_calgary_buildings(use_cache=True):
     # 1. Try to load from cache
     if use_cache and os.path.exists(CACHE_FILE):
         try:
-            with open(CACHE_FILE, "r") as f:
-                print("Loaded buildings from cache")
-                return json.load(f)
+            buildings = load_cache_file()
+            log.info("Loaded buildings from cache")
+            return buildings
         except:
-            print("Cache file corrupted, refetching...")
+            log.warning("Cache file corrupted, refetching...")
 
     # 2. Otherwise fetch from API
-    print("Fetching buildings from API...")
+    log.info("Fetching buildings from API...")
     buildings = fetch_from_api()
 
-    # 3. Save to cache
+    # 3. Save to cache. Gunicorn workers can get here at the same time on a cold
+    # start, so write a temp file and publish it atomically; readers never see a
+    # partial file, and the first worker to finish wins so they all serve one payload.
+    tmp_path = None
     try:
-        with open(CACHE_FILE, "w") as f:
-            json.dump(buildings, f)
-        print("Saved buildings to cache")
+        blob = zstd.ZstdCompressor(level=10).compress(orjson.dumps(buildings))
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(CACHE_FILE)), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(blob)
+        if use_cache:
+            os.link(tmp_path, CACHE_FILE)
+        else:
+            os.replace(tmp_path, CACHE_FILE)
+        log.info("Saved buildings to cache")
+    except FileExistsError:
+        try:
+            buildings = load_cache_file()
+            log.info("Another worker saved the cache first, using its buildings")
+        except Exception as e:
+            log.warning("Failed to load cache saved by another worker: %s", e)
     except Exception as e:
-        print("Failed to save cache:", e)
+        log.warning("Failed to save cache: %s", e)
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+    return buildings
+
+def build_params(where):
+    return {
+        "$limit": 50,
+        "$where": f"{where} AND assessed_value > 0 AND land_size_sf IS NOT NULL AND multipolygon IS NOT NULL",
+        "$order": "assessed_value DESC"
+    }
+
+# Turn one category's API records into building dicts
+def parse_category(category, data):
+    buildings = []
+    counts = Counter()
+
+    for rec in data:
+        coords = extract_coordinates(rec.get("multipolygon"))
+        if not coords:
+            continue
+
+        lat, lon = coords["centroid"]
+
+        building = {
+            "id": rec.get("roll_number"),
+            "address": rec.get("address"),
+            "latitude": lat,
+            "longitude": lon,
+            "zoning": rec.get("land_use_designation"),
+            "building_type": classify_type(rec.get("land_use_designation")),
+            "assessed_value": safe_float(rec.get("assessed_value")),
+            "land_size_sf": safe_float(rec.get("land_size_sf")),
+            "footprint": coords["footprint"],
+        }
 
+        # Only add if all popup-required fields exist
+        if (
+            building["id"]
+            and building["address"]
+            and building["assessed_value"] > 0
+            and building["zoning"]
+            and building["building_type"]
+        ):
+            buildings.append(building)
+            counts[building["building_type"]] += 1
+
+        if counts[category] >= 30:
+            break
+
+    log.info("%s: %d buildings loaded", category, counts[category])
     return buildings
 
+def fetch_category(category, where):
+    r = SESSION.get(BASE_URL, params=build_params(where), timeout=20)
+    r.raise_for_status()
+    return parse_category(category, r.json())
+
 def fetch_from_api():
-    print("Fetching balanced land-use buildings...")
+    log.info("Fetching balanced land-use buildings...")
 
     land_use_filters = {
         "Commercial": "land_use_designation like 'C-%'",
@@ -105,63 +195,31 @@ def fetch_from_api():
         "Special Purpose": "land_use_designation like 'S-%'"
     }
 
-    buildings = []
+    results = {}
 
-    # For each category, fetch 30 buildings if possible
-    for category, where in land_use_filters.items():
-        params = {
-            "$limit": 50,
-            "$where": f"{where} AND assessed_value > 0 AND land_size_sf IS NOT NULL AND multipolygon IS NOT NULL",
-            "$order": "assessed_value DESC"
+    # Categories are independent, so fetch them all concurrently (30 buildings each if possible)
+    with ThreadPoolExecutor(max_workers=len(land_use_filters)) as executor:
+        futures = {
+            executor.submit(fetch_category, category, where): category
+            for category, where in land_use_filters.items()
         }
 
-        try:
-            r = requests.get(BASE_URL, params=params, timeout=20)
-            r.raise_for_status()
-            data = r.json()
-
-            for rec in data:
-                coords = extract_coordinates(rec.get("multipolygon"))
-                if not coords:
-                    continue
-
-                lat, lon = coords["centroid"]
-
-                building = {
-                    "id": rec.get("roll_number"),
-                    "address": rec.get("address"),
-                    "latitude": lat,
-                    "longitude": lon,
-                    "zoning": rec.get("land_use_designation"),
-                    "building_type": classify_type(rec.get("land_use_designation")),
-                    "assessed_value": safe_float(rec.get("assessed_value")),
-                    "land_size_sf": safe_float(rec.get("land_size_sf")),
-                    "footprint": coords["footprint"],
-                }
-
-                # Only add if all popup-required fields exist
-                if (
-                    building["id"]
-                    and building["address"]
-                    and building["assessed_value"] > 0
-                    and building["zoning"]
-                    and building["building_type"]
-                ):
-                    buildings.append(building)
-
-                if len([b for b in buildings if b["building_type"] == category]) >= 30:
-                    break
-
-            print(f"{category}: {len([b for b in buildings if b['building_type']==category])} buildings loaded")
+        for future in as_completed(futures):
+            category = futures[future]
+            try:
+                results[category] = future.result()
+            except Exception as e:
+                log.warning("Error fetching category %s: %s", category, e)
 
-        except Exception as e:
-            print("Error fetching category:", category, e)
+    # Keep the original category order regardless of completion order
+    buildings = [b for category in land_use_filters if category in results for b in results[category]]
 
     # distribute heights visually
     buildings = assign_ranked_heights(buildings)
 
-    print(f"Total buildings loaded: {len(buildings)}")
+    log.info("Total buildings loaded: %d", len(buildings))
     return buildings
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     fetch_calgary_buildings()
\ No newline at end of file
@@ -1,109 +1,289 @@
 import os
+import re
+import copy
 import json
+import orjson
+import time
+import hashlib
+import logging
+import threading
 import requests
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
 HF_TOKEN = os.environ.get('HUGGINGFACE_API_KEY')
 
 if not HF_TOKEN:
     raise ValueError("No HuggingFace token found. Set HF_TOKEN in your .env file")
 
 API_URL = "https://router.huggingface.co/v1/chat/completions"
+# Deployments can point at a smaller or cheaper model without a code change
+LLM_MODEL = os.environ.get('LLM_MODEL', 'deepseek-ai/DeepSeek-V3.2:novita')
 headers = {
     "Authorization": f"Bearer {HF_TOKEN}",
+    "Content-Type": "application/json",
 }
 
-def query(payload):
-    response = requests.post(API_URL, headers=headers, json=payload, timeout=60)
-    return response.json()
+# Shared session so repeat queries reuse the warm HTTPS connection to the router
+SESSION = requests.Session()
+SESSION.headers.update(headers)
+# Chat completions have no side effects, so retrying a POST on a gateway error is safe.
+# Read timeouts are not retried: each attempt could otherwise wait out the full 60 s.
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=2, read=0, backoff_factor=0.3, status_forcelist=[502, 503, 504], allowed_methods=["POST"])
+))
 
-def process_query(user_query):
-    """
-    Process natural language query using HuggingFace Router API.
-    Returns a filter object for the building data.
-    """
-    
-    print(f"\n{'='*60}")
-    print(f"LLM Query Processing")
-    print(f"{'='*60}")
-    print(f"User Query: '{user_query}'")
-    
-    system_prompt = """You are a query parser for a Calgary building database. Extract ALL filter criteria from user queries.
+# Regexes used by the fallback parser, compiled once at import
+STREET_PATTERNS = [
+    (re.compile(r'on\s+(\d+)(?:st|nd|rd|th)?\s*(street|avenue|ave|st)?'), lambda m: m.group(1)),
+    (re.compile(r'on\s+([a-z]+)\s*(street|avenue|ave|st|road|rd|drive|dr|way|blvd|boulevard)'), lambda m: m.group(1)),
+]
+ZONING_RE = re.compile(r'\b([a-z]{1,3}-[a-z0-9]+)\b', re.IGNORECASE)
+MILLION_RE = re.compile(r'(\d+(?:\.\d+)?)\s*million')
+THOUSAND_K_RE = re.compile(r'(\d+(?:\.\d+)?)\s*k\b')
+THOUSAND_RE = re.compile(r'(\d+(?:\.\d+)?)\s*thousand')
+NUMBER_RE = re.compile(r'\$?(\d[\d,]*(?:\.\d+)?)')
+QUERY_NUMBER_RE = re.compile(r'\d+(?:[.,]\d+)*')
+QUERY_WORD_RE = re.compile(r'[a-z_]+')
+QUADRANT_WORD_RE = re.compile(r'\b(nw|ne|sw|se)\b')
 
-The database has these attributes:
-- height (in feet, numeric)
-- assessed_value (in dollars, numeric)  
-- zoning (string like "RC-G", "C-COR1", "M-C1", etc.)
-- building_type (one of: Commercial, Residential, Industrial, Mixed Use, Special Purpose, Other)
-- address (full street address including quadrant, e.g. "10101 SOUTHPORT RD SW")
-- land_size_sf (land size in square feet, numeric)
+JSON_DECODER = json.JSONDecoder()
 
-Calgary addresses end with a quadrant: NW, NE, SW, SE.
+# Comparison words, word-bounded so e.g. "Morehouse" or "overpass" don't read as "greater than"
+GREATER_RE = re.compile(r'\b(?:over|above|greater|more|exceeds?|exceeding|taller|larger)\b')
+LESS_RE = re.compile(r'\b(?:under|below|less|shorter|cheaper|smaller)\b')
 
-Return ONLY a valid JSON object with a "filters" array. Each filter has:
-- "attribute": the database field to filter on
-- "operator": one of ">", "<", ">=", "<=", "==", "!=", "contains", "equals", "endswith"
-- "value": the value to compare against
+# Phrases that place a query in a quadrant, built once per quadrant
+QUADRANT_PHRASES = tuple(
+    (quad, (f'in the {quad}', f'in {quad}', f' {quad} calgary', f' {quad} area'), f' {quad}')
+    for quad in ('nw', 'ne', 'sw', 'se')
+)
 
-For location queries:
-- "in the NW" or "in NW" -> {"attribute": "address", "operator": "endswith", "value": "NW"}
-- "on 17th avenue" -> {"attribute": "address", "operator": "contains", "value": "17"}
-- "on Stephen Ave" -> {"attribute": "address", "operator": "contains", "value": "STEPHEN"}
+BUILDING_TYPES = {
+    'commercial': 'Commercial',
+    'residential': 'Residential',
+    'industrial': 'Industrial',
+    'mixed use': 'Mixed Use',
+    'mixed-use': 'Mixed Use',
+    'special': 'Special Purpose'
+}
 
-Examples:
-Query: "buildings over 100 feet and commercial type"
-Response: {"filters": [{"attribute": "height", "operator": ">", "value": 100}, {"attribute": "building_type", "operator": "equals", "value": "Commercial"}]}
+# Attribute keywords, matched in one left-to-right pass over the query.
+# Longest keywords come first so "square feet" counts as land size, not height.
+ATTRIBUTE_KEYWORDS = {
+    'height': 'height', 'feet': 'height', 'tall': 'height', 'ft': 'height',
+    'value': 'value', 'worth': 'value', 'assessed': 'value', 'cost': 'value', 'price': 'value', '$': 'value',
+    'land size': 'land', 'lot size': 'land', 'square feet': 'land', 'sq ft': 'land', 'sqft': 'land', 'land_size': 'land',
+}
+ATTRIBUTE_KEYWORD_RE = re.compile('|'.join(
+    re.escape(kw) for kw in sorted(ATTRIBUTE_KEYWORDS, key=len, reverse=True)
+))
+
+# Every word the rule parser understands; a query with any other word goes to the LLM
+RULES_VOCABULARY = {
+    'a', 'all', 'any', 'are', 'building', 'buildings', 'find', 'get', 'is', 'list', 'me',
+    'please', 'properties', 'property', 'show', 'that', 'the', 'which', 'with',
+    'in', 'on', 'area', 'calgary', 'nw', 'ne', 'sw', 'se',
+    'street', 'avenue', 'ave', 'st', 'road', 'rd', 'drive', 'dr', 'way', 'blvd', 'boulevard',
+    'over', 'above', 'greater', 'more', 'exceed', 'exceeds', 'exceeding', 'taller', 'larger',
+    'under', 'below', 'less', 'shorter', 'cheaper', 'smaller', 'than',
+    'height', 'feet', 'foot', 'tall', 'ft', 'value', 'valued', 'worth', 'assessed', 'cost', 'price',
+    'land', 'lot', 'lots', 'size', 'land_size', 'square', 'sq', 'sqft',
+    'million', 'thousand', 'k', 'dollars', 'zoning', 'zoned',
+    'commercial', 'residential', 'industrial', 'mixed', 'use', 'special', 'purpose',
+}
+NUMERIC_ATTRIBUTES = {'height', 'assessed_value', 'land_size_sf'}
+
+# Longer input is truncated before parsing; nothing useful needs more, and it caps LLM input
+MAX_QUERY_LENGTH = 256
 
-Query: "show buildings in the NW"
-Response: {"filters": [{"attribute": "address", "operator": "endswith", "value": "NW"}]}
+# Exact-match cache of parsed queries: md5(normalized query) -> (timestamp, result)
+QUERY_CACHE_SIZE = 1024
+QUERY_CACHE_TTL = 1800
+query_cache = OrderedDict()
+query_cache_lock = threading.Lock()
 
-Query: "commercial buildings on centre street in NE"
-Response: {"filters": [{"attribute": "building_type", "operator": "equals", "value": "Commercial"}, {"attribute": "address", "operator": "contains", "value": "CENTRE"}, {"attribute": "address", "operator": "endswith", "value": "NE"}]}
+# Paraphrases fold onto one cache key: synonyms map to a canonical word, filler words drop out
+QUERY_SYNONYMS = {
+    'ft': 'feet', 'foot': 'feet',
+    'above': 'over', 'greater': 'over', 'more': 'over', 'exceeding': 'over',
+    'below': 'under', 'less': 'under',
+    'avenue': 'ave', 'av': 'ave', 'street': 'st', 'road': 'rd', 'drive': 'dr', 'boulevard': 'blvd',
+    'worth': 'value', 'valued': 'value', 'assessed': 'value',
+    'sqft': 'square feet', 'sq': 'square',
+    '>': 'over', '<': 'under',
+}
+QUERY_FILLER_WORDS = {
+    'a', 'all', 'any', 'are', 'building', 'buildings', 'find', 'get', 'is', 'list', 'me',
+    'please', 'properties', 'property', 'show', 'than', 'that', 'the', 'which', 'with'
+}
+# Comparison symbols are tokens of their own; >=, <=, = and != stay distinct from over/under
+QUERY_TOKEN_RE = re.compile(r"[<>!=]+|[a-z0-9$.,\-]+")
+# Queries using any other character keep their exact text as the key rather than risk a collision
+QUERY_CANONICAL_CHARS_RE = re.compile(r"[a-z0-9$.,\-<>!=\s'\"?()]*")
 
-Query: "buildings worth over 1 million"
-Response: {"filters": [{"attribute": "assessed_value", "operator": ">", "value": 1000000}]}
+# Results produced while the LLM was unreachable are worth retrying, so never cache them
+UNCACHED_SOURCES = {'FALLBACK_ERROR', 'FALLBACK_PARSE_ERROR', 'FALLBACK_EXCEPTION'}
 
-Query: "large lots over 5000 square feet"
-Response: {"filters": [{"attribute": "land_size_sf", "operator": ">", "value": 5000}]}
+# Short-lived cache of failed queries (same keys) so repeated garbage input never re-hits the LLM
+NEGATIVE_CACHE_SIZE = 512
+NEGATIVE_CACHE_TTL = 60
+negative_cache = OrderedDict()
 
-Respond with ONLY the JSON object, no other text or explanation."""
+# Static parser instructions sent with every LLM call; kept terse since every token adds latency
+SYSTEM_PROMPT = """Parse Calgary building queries into JSON filters.
+Fields: height (ft), assessed_value ($), land_size_sf (sq ft), zoning (e.g. "RC-G", "C-COR1"), building_type (Commercial|Residential|Industrial|Mixed Use|Special Purpose|Other), address (uppercase, ends in quadrant NW/NE/SW/SE, e.g. "10101 SOUTHPORT RD SW").
+Operators: > < >= <= == != contains equals endswith. Quadrants use address endswith; streets use address contains.
+Q: commercial buildings over 100 feet on centre street in NE
+A: {"filters":[{"attribute":"building_type","operator":"equals","value":"Commercial"},{"attribute":"height","operator":">","value":100},{"attribute":"address","operator":"contains","value":"CENTRE"},{"attribute":"address","operator":"endswith","value":"NE"}]}
+Q: buildings worth over 1 million on 17th avenue
+A: {"filters":[{"attribute":"assessed_value","operator":">","value":1000000},{"attribute":"address","operator":"contains","value":"17"}]}
+Q: lots over 5000 square feet
+A: {"filters":[{"attribute":"land_size_sf","operator":">","value":5000}]}
+Reply with the JSON object only."""
+
+def canonical_query(query_norm):
+    """Reduce a normalized query to a canonical form so simple paraphrases share a cache entry."""
+    if not QUERY_CANONICAL_CHARS_RE.fullmatch(query_norm):
+        return query_norm
+    
+    words = []
+    for token in QUERY_TOKEN_RE.findall(query_norm):
+        token = token.strip('.,').replace(',', '')
+        if token and token not in QUERY_FILLER_WORDS:
+            words.append(QUERY_SYNONYMS.get(token, token))
+    return ' '.join(words)
 
+
+def query(payload):
+    response = SESSION.post(API_URL, data=orjson.dumps(payload), timeout=60)
     try:
-        print("Sending request to HuggingFace Router API...")
+        return orjson.loads(response.content)
+    except orjson.JSONDecodeError as e:
+        # A non-JSON body (e.g. a gateway HTML page) is a transport failure, not a parse bug
+        raise requests.RequestException(f"Non-JSON response (HTTP {response.status_code})", response=response) from e
+
+def process_query(user_query):
+    """
+    Process natural language query, using the rule-based parser first and the
+    HuggingFace Router API for queries it cannot handle.
+    Returns a filter object for the building data.
+    
+    Successful results are cached by canonical query text for QUERY_CACHE_TTL
+    seconds and failures for NEGATIVE_CACHE_TTL seconds; results produced while
+    the LLM was unreachable are not cached at all. Callers always get a deep
+    copy so the cached entry stays intact.
+    """
+    query_norm = (user_query or "").strip()[:MAX_QUERY_LENGTH].lower()
+    if not query_norm:
+        return {'success': False, 'error': 'No query provided', 'source': 'GUARD'}
+    
+    key = hashlib.md5(canonical_query(query_norm).encode()).hexdigest()
+    
+    with query_cache_lock:
+        now = time.monotonic()
+        
+        entry = query_cache.get(key)
+        if entry is not None:
+            cached_at, cached_result = entry
+            if now - cached_at < QUERY_CACHE_TTL:
+                query_cache.move_to_end(key)
+                log.debug("Query cache hit for: '%s'", query_norm)
+                return copy.deepcopy(cached_result)
+            del query_cache[key]
+        
+        entry = negative_cache.get(key)
+        if entry is not None:
+            failed_at, error = entry
+            if now - failed_at < NEGATIVE_CACHE_TTL:
+                log.debug("Negative cache hit for: '%s'", query_norm)
+                return {'success': False, 'error': error, 'source': 'NEG_CACHE'}
+            del negative_cache[key]
+    
+    result = parse_query(query_norm)
+    
+    if result.get('source') in UNCACHED_SOURCES:
+        return result
+    
+    with query_cache_lock:
+        if not result.get('success'):
+            negative_cache[key] = (time.monotonic(), result.get('error'))
+            negative_cache.move_to_end(key)
+            if len(negative_cache) > NEGATIVE_CACHE_SIZE:
+                negative_cache.popitem(last=False)
+        else:
+            query_cache[key] = (time.monotonic(), copy.deepcopy(result))
+            query_cache.move_to_end(key)
+            if len(query_cache) > QUERY_CACHE_SIZE:
+                query_cache.popitem(last=False)
+    
+    return result
+
+
+def process_queries(queries):
+    """
+    Process several queries concurrently, returning results in input order.
+    Uncached queries overlap their LLM round trips over the pooled session.
+    """
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        return list(executor.map(process_query, queries))
+
+
+def parse_query(user_query):
+    """Parse an already-normalized query with the rule parser, escalating to the LLM only on a miss."""
+    
+    rules_result = fallback_parser(user_query)
+    if rules_result['success'] and is_unambiguous(user_query, rules_result['filter']['filters']):
+        rules_result['source'] = 'RULES'
+        return rules_result
+    
+    log.debug("LLM query processing for: '%s'", user_query)
+    
+    try:
+        log.debug("Sending request to HuggingFace Router API...")
         
         response = query({
             "messages": [
                 {
                     "role": "system",
-                    "content": system_prompt
+                    "content": SYSTEM_PROMPT
                 },
                 {
                     "role": "user",
                     "content": user_query
                 }
             ],
-            "model": "deepseek-ai/DeepSeek-V3.2:novita",
-            "max_tokens": 250,
+            "model": LLM_MODEL,
+            "max_tokens": 150,
             "temperature": 0.1
         })
         
-        print(f"Raw API Response: {json.dumps(response, indent=2)}")
+        # Only pay for the indented dump when DEBUG logging is on
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Raw API Response: %s", orjson.dumps(response, option=orjson.OPT_INDENT_2).decode())
         
         if "error" in response:
-            print(f"API Error: {response['error']}")
-            result = fallback_parser(user_query)
+            log.warning("API Error: %s", response['error'])
+            result = rules_result
             result['source'] = 'FALLBACK_ERROR'
             return result
         
         generated_text = response["choices"][0]["message"]["content"]
-        print(f"Generated Text: {generated_text}")
+        log.debug("Generated Text: %s", generated_text)
         
         filter_obj = extract_json(generated_text)
         
         if filter_obj:
-            print(f"LLM Successfully Parsed: {filter_obj}")
+            log.debug("LLM Successfully Parsed: %s", filter_obj)
             return {
                 'success': True,
                 'filter': filter_obj,
@@ -111,133 +291,108 @@ Respond with ONLY the JSON object, no other text or explanation."""
                 'source': 'LLM'
             }
         else:
-            print("LLM returned invalid JSON, falling back to rule-based parser")
-            result = fallback_parser(user_query)
+            log.warning("LLM returned invalid JSON")
+            result = rules_result
             result['source'] = 'FALLBACK'
             return result
             
     except requests.RequestException as e:
-        print(f"Request Error: {e}")
-        result = fallback_parser(user_query)
+        log.warning("Request Error: %s", e)
+        result = rules_result
         result['source'] = 'FALLBACK_ERROR'
         return result
     except KeyError as e:
-        print(f"Response parsing error: {e}")
-        result = fallback_parser(user_query)
+        log.warning("Response parsing error: %s", e)
+        result = rules_result
         result['source'] = 'FALLBACK_PARSE_ERROR'
         return result
-    except Exception as e:
-        print(f"Processing Error: {e}")
-        import traceback
-        traceback.print_exc()
-        result = fallback_parser(user_query)
+    except Exception:
+        log.exception("process_query failed for query=%r", user_query)
+        result = rules_result
         result['source'] = 'FALLBACK_EXCEPTION'
         return result
 
 
 def extract_json(text):
-    """Extract JSON object from text response."""
-    try:
-        text = text.strip()
-        
-        if "```json" in text:
-            start = text.find("```json") + 7
-            end = text.find("```", start)
-            text = text[start:end].strip()
-        elif "```" in text:
-            start = text.find("```") + 3
-            end = text.find("```", start)
-            text = text[start:end].strip()
-        
-        start = text.find('{')
-        end = text.rfind('}') + 1
-        
-        if start != -1 and end > start:
-            json_str = text[start:end]
-            return json.loads(json_str)
-    except json.JSONDecodeError:
-        pass
+    """
+    Extract the first JSON object embedded in a text response. Returns None
+    unless it looks like a filter object (a top-level 'filters' or 'attribute' key).
+    """
+    # raw_decode parses in place from each candidate brace and ignores whatever
+    # follows the object, so code fences and trailing prose need no slicing
+    start = text.find('{')
+    while start != -1:
+        try:
+            obj, _ = JSON_DECODER.raw_decode(text, start)
+        except json.JSONDecodeError:
+            start = text.find('{', start + 1)
+            continue
+        # An outer object of the wrong shape is rejected whole rather than searched for fragments
+        if isinstance(obj, dict) and ('filters' in obj or 'attribute' in obj):
+            return obj
+        return None
     
     return None
 
 
 def fallback_parser(query):
     """Rule-based fallback parser for common query patterns."""
-    print(f"Using fallback parser for: '{query}'")
+    log.debug("Using fallback parser for: '%s'", query)
     
     query_lower = query.lower()
+    # Numbers and attribute words come from the rest of the query, so "17th" or "C-COR1" can't become a value
+    query_rest = strip_free_text(query_lower)
     filters = []
+    attributes = {ATTRIBUTE_KEYWORDS[kw] for kw in ATTRIBUTE_KEYWORD_RE.findall(query_rest)}
     
     # Quadrant queries (NW, NE, SW, SE) - check address ending
-    for quad in ['nw', 'ne', 'sw', 'se']:
-        patterns = [
-            f'in the {quad}',
-            f'in {quad}',
-            f' {quad} calgary',
-            f' {quad} area'
-        ]
-        if any(p in query_lower for p in patterns) or query_lower.endswith(f' {quad}'):
+    for quad, phrases, suffix in QUADRANT_PHRASES:
+        if any(p in query_lower for p in phrases) or query_lower.endswith(suffix):
             filters.append({'attribute': 'address', 'operator': 'endswith', 'value': quad.upper()})
             break
     
     # Street/Avenue queries
-    street_patterns = [
-        (r'on\s+(\d+(?:st|nd|rd|th)?)\s*(street|avenue|ave|st)?', lambda m: m.group(1)),
-        (r'on\s+([a-z]+)\s*(street|avenue|ave|st|road|rd|drive|dr|way|blvd|boulevard)', lambda m: m.group(1)),
-    ]
-    for pattern, extractor in street_patterns:
-        match = re.search(pattern, query_lower)
+    for pattern, extractor in STREET_PATTERNS:
+        match = pattern.search(query_lower)
         if match:
             street_name = extractor(match).upper()
             filters.append({'attribute': 'address', 'operator': 'contains', 'value': street_name})
             break
     
     # Height queries
-    height_keywords = ['height', 'feet', 'tall', 'ft']
-    if any(kw in query_lower for kw in height_keywords):
-        number = extract_number(query)
+    if 'height' in attributes:
+        number = extract_number(query_rest)
         if number:
-            if any(kw in query_lower for kw in ['over', 'above', 'greater', 'more than', 'taller']):
+            if GREATER_RE.search(query_lower):
                 filters.append({'attribute': 'height', 'operator': '>', 'value': number})
-            elif any(kw in query_lower for kw in ['under', 'below', 'less', 'shorter']):
+            elif LESS_RE.search(query_lower):
                 filters.append({'attribute': 'height', 'operator': '<', 'value': number})
     
     # Value queries
-    value_keywords = ['value', 'worth', 'assessed', 'cost', 'price']
-    if any(kw in query_lower for kw in value_keywords) or '$' in query_lower:
-        number = extract_number(query)
+    if 'value' in attributes:
+        number = extract_number(query_rest)
         if number:
-            if any(kw in query_lower for kw in ['over', 'above', 'more', 'greater', 'exceeds']):
+            if GREATER_RE.search(query_lower):
                 filters.append({'attribute': 'assessed_value', 'operator': '>', 'value': number})
-            elif any(kw in query_lower for kw in ['under', 'below', 'less', 'cheaper']):
+            elif LESS_RE.search(query_lower):
                 filters.append({'attribute': 'assessed_value', 'operator': '<', 'value': number})
     
     # Land size queries
-    land_keywords = ['land size', 'lot size', 'square feet', 'sq ft', 'sqft', 'land_size']
-    if any(kw in query_lower for kw in land_keywords):
-        number = extract_number(query)
+    if 'land' in attributes:
+        number = extract_number(query_rest)
         if number:
-            if any(kw in query_lower for kw in ['over', 'above', 'more', 'greater', 'larger']):
+            if GREATER_RE.search(query_lower):
                 filters.append({'attribute': 'land_size_sf', 'operator': '>', 'value': number})
-            elif any(kw in query_lower for kw in ['under', 'below', 'less', 'smaller']):
+            elif LESS_RE.search(query_lower):
                 filters.append({'attribute': 'land_size_sf', 'operator': '<', 'value': number})
     
     # Building type queries
-    building_types = {
-        'commercial': 'Commercial',
-        'residential': 'Residential',
-        'industrial': 'Industrial',
-        'mixed use': 'Mixed Use',
-        'mixed-use': 'Mixed Use',
-        'special': 'Special Purpose'
-    }
-    for btype, proper_name in building_types.items():
-        if btype in query_lower:
-            filters.append({'attribute': 'building_type', 'operator': 'equals', 'value': proper_name})
-            break
+    building_type = next((name for key, name in BUILDING_TYPES.items() if key in query_lower), None)
+    if building_type:
+        filters.append({'attribute': 'building_type', 'operator': 'equals', 'value': building_type})
     
     # Zoning queries
-    zoning_match = re.search(r'\b([a-z]{1,3}-[a-z0-9]+)\b', query_lower, re.IGNORECASE)
+    zoning_match = ZONING_RE.search(query_lower)
     if zoning_match:
         filters.append({'attribute': 'zoning', 'operator': 'contains', 'value': zoning_match.group(1).upper()})
     
@@ -255,27 +410,62 @@ def fallback_parser(query):
     }
 
 
+def strip_free_text(query_lower):
+    """Blank out the street name and zoning code the parser reads, leaving the rest of the query."""
+    for pattern, _ in STREET_PATTERNS:
+        query_lower, count = pattern.subn(' ', query_lower, count=1)
+        if count:
+            break
+    return ZONING_RE.sub(' ', query_lower, count=1)
+
+
+def is_unambiguous(query, filters):
+    """
+    Whether the rule parser's filters fully account for a query: every word is
+    one it understands, every quadrant mentioned became a filter, at most one
+    numeric comparison is asked for, and each number in the query went into a filter.
+    """
+    # Street names and zoning codes are free text the rules already captured
+    query_lower = strip_free_text(query.lower())
+    
+    if any(word not in RULES_VOCABULARY for word in QUERY_WORD_RE.findall(query_lower)):
+        return False
+    
+    quadrants = {f['value'] for f in filters if f['attribute'] == 'address' and f['operator'] == 'endswith'}
+    if any(quad.upper() not in quadrants for quad in QUADRANT_WORD_RE.findall(query_lower)):
+        return False
+    
+    attributes = {ATTRIBUTE_KEYWORDS[kw] for kw in ATTRIBUTE_KEYWORD_RE.findall(query_lower)}
+    numeric_filters = sum(f['attribute'] in NUMERIC_ATTRIBUTES for f in filters)
+    if len(attributes) > 1 or numeric_filters > 1:
+        return False
+    if GREATER_RE.search(query_lower) and LESS_RE.search(query_lower):
+        return False
+    
+    return len(QUERY_NUMBER_RE.findall(query_lower)) == numeric_filters
+
+
 def extract_number(text):
     """Extract a number from text, handling various formats."""
     text_lower = text.lower()
     
     # Handle millions
-    match = re.search(r'(\d+(?:\.\d+)?)\s*million', text_lower)
+    match = MILLION_RE.search(text_lower)
     if match:
         return float(match.group(1)) * 1000000
     
     # Handle thousands (k)
-    match = re.search(r'(\d+(?:\.\d+)?)\s*k\b', text_lower)
+    match = THOUSAND_K_RE.search(text_lower)
     if match:
         return float(match.group(1)) * 1000
     
     # Handle thousands (thousand)
-    match = re.search(r'(\d+(?:\.\d+)?)\s*thousand', text_lower)
+    match = THOUSAND_RE.search(text_lower)
     if match:
         return float(match.group(1)) * 1000
     
     # Match regular numbers (including currency)
-    match = re.search(r'\$?([\d,]+(?:\.\d+)?)', text)
+    match = NUMBER_RE.search(text)
     if match:
         return float(match.group(1).replace(',', ''))
     
@@ -286,7 +476,7 @@ if __name__ == "__main__":
     print("Testing API connection...")
     test_response = query({
         "messages": [{"role": "user", "content": "Say 'working'"}],
-        "model": "deepseek-ai/DeepSeek-V3.2:novita",
+        "model": LLM_MODEL,
         "max_tokens": 10
     })
     print(f"Connection test: {test_response}")
@@ -303,7 +493,6 @@ if __name__ == "__main__":
         "buildings on centre street"
     ]
     
-    for q in test_queries:
-        result = process_query(q)
+    for q, result in zip(test_queries, process_queries(test_queries)):
         print(f"\nQuery: {q}")
         print(f"Result: {result}\n")
\ No newline at end of file
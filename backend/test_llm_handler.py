@@ -0,0 +1,57 @@
+import os
+import unittest
+
+os.environ.setdefault('HUGGINGFACE_API_KEY', 'test')
+
+from llm_handler import fallback_parser, is_unambiguous
+
+# Query -> filters the rule parser answers with, or None when the query must go to the LLM
+RULES_CASES = [
+    ("buildings over 100 feet", [
+        {'attribute': 'height', 'operator': '>', 'value': 100.0},
+    ]),
+    ("commercial buildings in NW", [
+        {'attribute': 'address', 'operator': 'endswith', 'value': 'NW'},
+        {'attribute': 'building_type', 'operator': 'equals', 'value': 'Commercial'},
+    ]),
+    ("buildings on 17th avenue", [
+        {'attribute': 'address', 'operator': 'contains', 'value': '17'},
+    ]),
+    ("buildings on 17th avenue over 100 feet", [
+        {'attribute': 'address', 'operator': 'contains', 'value': '17'},
+        {'attribute': 'height', 'operator': '>', 'value': 100.0},
+    ]),
+    ("buildings on 8th avenue worth over 2000000", [
+        {'attribute': 'address', 'operator': 'contains', 'value': '8'},
+        {'attribute': 'assessed_value', 'operator': '>', 'value': 2000000.0},
+    ]),
+    ("c-cor1 buildings under 50 feet", [
+        {'attribute': 'height', 'operator': '<', 'value': 50.0},
+        {'attribute': 'zoning', 'operator': 'contains', 'value': 'C-COR1'},
+    ]),
+    ("properties worth over $1 million", [
+        {'attribute': 'assessed_value', 'operator': '>', 'value': 1000000.0},
+    ]),
+    ("NW Calgary commercial buildings", None),
+    ("commercial buildings over 50 feet worth more than 1 million", None),
+    ("buildings worth over 1 million but under 50 feet tall", None),
+    ("in the NW owned by the city", None),
+    ("buildings 100 feet", None),
+]
+
+
+class RulesParserTest(unittest.TestCase):
+    def test_rules_cases(self):
+        for query, expected in RULES_CASES:
+            with self.subTest(query=query):
+                result = fallback_parser(query.lower())
+                accepted = result['success'] and is_unambiguous(query.lower(), result['filter']['filters'])
+                if expected is None:
+                    self.assertFalse(accepted)
+                else:
+                    self.assertTrue(accepted)
+                    self.assertEqual(result['filter']['filters'], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,8 +6,18 @@ import axios from 'axios';
 
 const API_BASE = import.meta.env.VITE_API_URL || 'http://localhost:5000/api';
 
+// Query matches arrive as base64-packed uint32 indices into the buildings array
+const decodeRows = (b64) => {
+  const bytes = Uint8Array.from(atob(b64), (c) => c.charCodeAt(0));
+  return new Uint32Array(bytes.buffer);
+};
+
+// ETag headers may come back quoted or weakened (W/"...") by proxies
+const normalizeEtag = (etag) => (etag || '').replace(/^W\//, '').replace(/"/g, '');
+
 function Dashboard() {
   const [buildings, setBuildings] = useState([]);
+  const [buildingsEtag, setBuildingsEtag] = useState(null);
   const [selectedBuilding, setSelectedBuilding] = useState(null);
   const [highlightedIds, setHighlightedIds] = useState([]);
   const [loading, setLoading] = useState(true);
@@ -18,16 +28,26 @@ function Dashboard() {
     fetchBuildings();
   }, []);
 
+  // revalidate bypasses a possibly stale browser-cached copy of the buildings
+  const loadBuildings = async (revalidate = false) => {
+    const response = await axios.get(
+      `${API_BASE}/buildings`,
+      revalidate ? { headers: { 'Cache-Control': 'no-cache' } } : undefined
+    );
+    if (!response.data.success) {
+      throw new Error(response.data.error);
+    }
+    const etag = normalizeEtag(response.headers.etag);
+    setBuildings(response.data.data);
+    setBuildingsEtag(etag);
+    return { data: response.data.data, etag };
+  };
+
   const fetchBuildings = async () => {
     try {
       setLoading(true);
-      const response = await axios.get(`${API_BASE}/buildings`);
-      if (response.data.success) {
-        setBuildings(response.data.data);
-        setError(null);
-      } else {
-        setError(response.data.error);
-      }
+      await loadBuildings();
+      setError(null);
     } catch (err) {
       setError('Failed to fetch property data. Make sure the backend is running.');
       console.error('Fetch error:', err);
@@ -46,7 +66,18 @@ function Dashboard() {
       const response = await axios.post(`${API_BASE}/query`, { query });
       
       if (response.data.success) {
-        setHighlightedIds(response.data.matching_ids);
+        // Rows only make sense against the exact building list the server filtered
+        let current = { data: buildings, etag: buildingsEtag };
+        if (current.etag !== response.data.etag) {
+          current = await loadBuildings(true);
+        }
+        const rows = decodeRows(response.data.matching_rows);
+        if (current.etag !== response.data.etag || rows.some((row) => row >= current.data.length)) {
+          setError('Property data changed on the server. Please run the query again.');
+          setHighlightedIds([]);
+          return;
+        }
+        setHighlightedIds(Array.from(rows, (row) => current.data[row].id));
         setQueryResult({
           filter: response.data.filter,
           count: response.data.count